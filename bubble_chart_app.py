@@ -1,16 +1,20 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib.colors import hsv_to_rgb
 import io
-import base64
+import os
 import random
 import colorsys
-import time
-import os
-from matplotlib import font_manager as fm
-import matplotlib as mpl
+import base64
+import json
+import uuid
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import chart_render
+import jshtml_template as jshtml
+import player_template
 
 # Set page config
 st.set_page_config(
@@ -73,6 +77,8 @@ if 'discovered_categories' not in st.session_state:
     st.session_state.discovered_categories = []
 if 'colors' not in st.session_state:
     st.session_state.colors = {}
+if 'animation' not in st.session_state:
+    st.session_state.animation = None
 
 # Header
 st.markdown('<div class="main-header">🎯 Dynamic Bubble Chart Generator</div>', unsafe_allow_html=True)
@@ -100,120 +106,186 @@ st.sidebar.subheader("🎬 Animation Settings")
 num_frames = st.sidebar.slider("Number of Frames", 30, 200, 100)
 interval = st.sidebar.slider("Speed (ms)", 50, 500, 150)
 scale = st.sidebar.number_input("Size Scale", value=0.0005, format="%.4f")
+browser_render = st.sidebar.checkbox(
+    "Render Preview in Browser", value=True,
+    help="Draw every frame client-side from the chart data instead of embedding one image per frame"
+)
+
+# Frames for the in-app preview, drawn at chart_render.PREVIEW_DPI; the GIF export
+# uses num_frames at full DPI
+PREVIEW_FRAMES = 30
+
+# The render pool lives as long as the server, so keep it to a few processes
+RENDER_WORKERS = min(os.cpu_count() or 1, 4)
 
 # Helper functions
 @st.cache_data
-def load_data(file):
-    """Load CSV data"""
+def load_data(file, category_column, label_column):
+    """Load CSV data, preferring Arrow-backed columns when pyarrow is available"""
     if file is not None:
-        return pd.read_csv(file)
+        # Parse the text columns straight to strings; numeric columns are left to
+        # inference
+        dtype = {category_column: 'string', label_column: 'string'}
+        try:
+            data = pd.read_csv(file, engine='pyarrow', dtype_backend='pyarrow', dtype=dtype)
+        except (ImportError, TypeError, ValueError):
+            # No pyarrow, an older pandas, or a file the Arrow parser rejects
+            file.seek(0)
+            data = pd.read_csv(file, dtype=dtype)
+        
+        # Categorize after parsing so both readers give string categories, even
+        # for numeric codes, matching the names discover_categories_from_data returns
+        if category_column in data:
+            data[category_column] = data[category_column].astype('category')
+        return data
     return None
 
+@st.cache_data(show_spinner=False)
 def discover_categories_from_data(start_data, end_data, category_column):
     """Discover unique categories"""
-    all_categories = pd.concat([
-        start_data[category_column], 
-        end_data[category_column]
-    ]).unique()
-    
-    categories = [str(cat) for cat in all_categories if pd.notna(cat)]
-    return sorted(categories)
+    categories = np.union1d(
+        start_data[category_column].dropna().unique().astype(str),
+        end_data[category_column].dropna().unique().astype(str)
+    )
+    return categories.tolist()
 
 def generate_distinct_colors(num_colors):
     """Generate visually distinct colors"""
-    colors = []
     golden_ratio = 0.618033988749895
+    i = np.arange(num_colors)
     
-    for i in range(num_colors):
-        hue = (i * golden_ratio) % 1.0
-        saturation = 0.7 + (i % 3) * 0.1
-        value = 0.8 + (i % 2) * 0.15
-        
-        r, g, b = colorsys.hsv_to_rgb(hue, saturation, value)
-        hex_color = f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
-        colors.append(hex_color)
+    hsv = np.stack([
+        (i * golden_ratio) % 1.0,
+        0.7 + (i % 3) * 0.1,
+        0.8 + (i % 2) * 0.15
+    ], axis=-1)
+    rgb = (hsv_to_rgb(hsv) * 255).astype(np.uint8)
     
-    return colors
+    # Hex-encode the packed RGB bytes in one call, then split into 6-digit colors
+    hex_digits = rgb.tobytes().hex()
+    return ['#' + hex_digits[start:start + 6] for start in range(0, len(hex_digits), 6)]
 
-def create_animated_chart(start_data, end_data, params):
-    """Create the animated bubble chart"""
-    # Apply scaling
-    start_scaled = start_data.copy()
-    end_scaled = end_data.copy()
-    start_scaled[params['size_column']] *= params['scale']
-    end_scaled[params['size_column']] *= params['scale']
+@st.cache_data(show_spinner=False)
+def preprocess_data(start_data, end_data, x_column, y_column, size_column, category_column, label_column):
+    """Convert both datasets to plot-ready arrays"""
+    start_arrays, end_arrays = {}, {}
     
-    # Calculate medians
-    q1median_x = start_scaled[params['x_column']].median()
-    q2median_x = end_scaled[params['x_column']].median()
-    q1median_y = start_scaled[params['y_column']].median()
-    q2median_y = end_scaled[params['y_column']].median()
+    # Text is stored as fixed-width strings: st.cache_data hashes object arrays by
+    # pointer, so they would never match a cached animation
+    for arrays, data in ((start_arrays, start_data), (end_arrays, end_data)):
+        labels = data[label_column]
+        arrays['cat'] = data[category_column].astype(str).to_numpy(dtype=str)
+        arrays['label_idx'] = np.flatnonzero(labels.notna())
+        arrays['label'] = labels.dropna().astype(str).to_numpy(dtype=str)
     
-    # Set up axis limits
-    all_x = pd.concat([start_scaled[params['x_column']], end_scaled[params['x_column']]])
-    all_y = pd.concat([start_scaled[params['y_column']], end_scaled[params['y_column']]])
+    # float32 is plenty for on-screen positions and halves the memory every later
+    # step touches; missing values become NaN for either reader's dtypes
+    for key, col in (('x', x_column), ('y', y_column), ('size', size_column)):
+        for arrays, data in ((start_arrays, start_data), (end_arrays, end_data)):
+            arrays[key] = data[col].to_numpy(dtype=np.float32, na_value=np.nan)
     
-    min_x, max_x = all_x.min(), all_x.max()
-    min_y, max_y = all_y.min(), all_y.max()
+    # Medians only depend on the data, so keep them with the cached arrays
+    for arrays in (start_arrays, end_arrays):
+        arrays['median_x'] = np.nanmedian(arrays['x'])
+        arrays['median_y'] = np.nanmedian(arrays['y'])
     
-    x_range, y_range = max_x - min_x, max_y - min_y
-    x_padding = x_range * 0.15 if x_range > 0 else 1
-    y_padding = y_range * 0.15 if y_range > 0 else 1
+    return start_arrays, end_arrays
+
+# The browser player's frames, which depend only on the data, bubble scale and frame
+# count, so color, title or speed changes reuse them; build_player_html only reads
+# the shared arrays. Preview and GIF workers compute their own through setup_chart
+@st.cache_resource(max_entries=8, show_spinner=False)
+def compute_chart_frames(start_arrays, end_arrays, scale, num_frames):
+    """Axis limits plus interpolated points and median lines, kept across reruns"""
+    return chart_render.compute_chart_frames(start_arrays, end_arrays, scale, num_frames)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_animation_html(start_arrays, end_arrays, params):
+    """Render the preview animation to HTML, reused while the inputs are unchanged"""
+    # Frames are rendered in parallel and filled into a copy of matplotlib's jshtml player
+    frames = render_sharded(chart_render.render_png_frames, start_arrays, end_arrays, params,
+                            params['preview_frames'])
+    return jshtml.JS_INCLUDE + jshtml.STYLE_INCLUDE + jshtml.DISPLAY_TEMPLATE.format(
+        id=uuid.uuid4().hex, Nframes=len(frames), fill_frames=jshtml.embedded_frames(frames),
+        interval=params['interval'], once_checked='', loop_checked='checked', reflect_checked='')
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_player_html(start_arrays, end_arrays, params):
+    """Ship the precomputed frames to a canvas player that renders in the browser"""
+    frames = compute_chart_frames(start_arrays, end_arrays, params['scale'], params['num_frames'])
+    categories = pd.Categorical(start_arrays['cat'])
     
-    xlim = (min_x - x_padding, max_x + x_padding)
-    ylim = (min_y - y_padding, max_y + y_padding)
+    def encode(array, dtype):
+        return base64.b64encode(np.ascontiguousarray(array, dtype=dtype).tobytes()).decode('ascii')
     
-    # Create animation
-    fig, ax = plt.subplots(figsize=(12, 8))
+    # Positions and sizes go out as 16-bit fixed point, half the bytes of float32:
+    # positions relative to the axis limits, sizes as marker diameters (sqrt of the
+    # area), which keeps sub-point steps as bubbles grow
+    qmax, size_steps = 65534, 64
+    positions = np.empty(frames['offsets'].shape, dtype='<u2')
+    for axis, (lo, hi) in enumerate((frames['xlim'], frames['ylim'])):
+        scaled = np.rint((frames['offsets'][..., axis] - lo) / (hi - lo) * qmax)
+        positions[..., axis] = np.where(np.isnan(scaled), qmax + 1, scaled)
     
-    def animate(frame):
-        ax.clear()
-        
-        progress = frame / (params['num_frames'] - 1) if params['num_frames'] > 1 else 0
-        
-        # Interpolate data
-        x = start_scaled[params['x_column']] + (end_scaled[params['x_column']] - start_scaled[params['x_column']]) * progress
-        y = start_scaled[params['y_column']] + (end_scaled[params['y_column']] - start_scaled[params['y_column']]) * progress
-        sizes = start_scaled[params['size_column']] + (end_scaled[params['size_column']] - start_scaled[params['size_column']]) * progress
-        
-        # Create scatter plot
-        ax.scatter(x, y, s=sizes, alpha=0.75, 
-                  c=start_scaled[params['category_column']].map(params['colors']), 
-                  edgecolors='white', linewidth=0.8)
-        
-        # Add median lines
-        current_x_pos = q1median_x + (q2median_x - q1median_x) * progress
-        current_y_pos = q1median_y + (q2median_y - q1median_y) * progress
-        
-        ax.axvline(current_x_pos, color='#666666', linestyle='-', linewidth=1.0, alpha=0.8)
-        ax.axhline(current_y_pos, color='#666666', linestyle='-', linewidth=1.0, alpha=0.8)
-        
-        # Add labels
-        for i, (x_val, y_val, title) in enumerate(zip(x, y, start_scaled[params['label_column']])):
-            if pd.notna(title):
-                ax.annotate(str(title), (x_val, y_val), color='black',
-                           textcoords="offset points", xytext=(0, 12), 
-                           ha='center', fontsize=9, fontweight='normal')
-        
-        # Styling
-        ax.set_xlim(xlim)
-        ax.set_ylim(ylim)
-        ax.set_xticklabels([])
-        ax.set_yticklabels([])
-        ax.tick_params(left=False, bottom=False)
-        ax.set_facecolor('#FAFAFA')
-        
-        for spine in ax.spines.values():
-            spine.set_visible(False)
-        
-        ax.set_title(f'{params["title"]} Landscape Over Time - Frame {frame+1}', 
-                    fontsize=14, fontweight='bold')
+    diameters = np.sqrt(np.clip(frames['sizes'], 0, None)) * size_steps
+    diameters = np.clip(np.nan_to_num(np.rint(diameters)), 0, np.iinfo(np.uint16).max)
+    
+    payload = {
+        'title': params['title'],
+        'interval': params['interval'],
+        'frames': params['num_frames'],
+        'points': len(start_arrays['cat']),
+        'xlim': [float(v) for v in frames['xlim']],
+        'ylim': [float(v) for v in frames['ylim']],
+        'qmax': qmax,
+        'size_steps': size_steps,
+        'xy': encode(positions, '<u2'),
+        'diameters': encode(diameters, '<u2'),
+        'median_x': frames['median_x'].tolist(),
+        'median_y': frames['median_y'].tolist(),
+        'color_codes': encode(categories.codes, '<u2'),
+        'palette': [params['colors'][cat] for cat in categories.categories],
+        'label_idx': start_arrays['label_idx'].tolist(),
+        'labels': start_arrays['label'].tolist()
+    }
     
-    anim = FuncAnimation(fig, animate, frames=params['num_frames'], 
-                       interval=params['interval'], repeat=True, blit=False)
+    # Escape '</' so label text can never close the script tag early
+    return player_template.PLAYER_TEMPLATE.replace('/*DATA*/', json.dumps(payload).replace('</', '<\\/'))
+
+@st.cache_resource(show_spinner=False)
+def get_render_pool():
+    """Worker processes shared by every session for rendering frames in parallel"""
+    # Workers are spawned rather than forked from the threaded server, and the tasks
+    # are chart_render functions, which pickle by module name. Streamlit points
+    # __main__ at this script, so each worker also re-runs it once as __mp_main__ at
+    # startup: it imports streamlit and builds the page and sidebar in bare mode,
+    # while main() stays behind its guard
+    return ProcessPoolExecutor(RENDER_WORKERS, mp_context=mp.get_context('spawn'))
+
+def render_sharded(render, start_arrays, end_arrays, params, num_frames):
+    """Render every frame with render, split across worker processes, in frame order"""
+    workers = min(RENDER_WORKERS, num_frames)
+    if workers > 1:
+        shards = np.array_split(np.arange(num_frames), workers)
+        try:
+            futures = [get_render_pool().submit(render, start_arrays, end_arrays, params, shard)
+                       for shard in shards]
+            return [image for future in futures for image in future.result()]
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool next time and render this run here
+            get_render_pool.clear()
     
-    plt.tight_layout()
-    return fig, anim
+    return render(start_arrays, end_arrays, params, range(num_frames))
+
+def create_gif(start_arrays, end_arrays, params):
+    """Render every frame, split across worker processes, into an in-memory GIF"""
+    frames = render_sharded(chart_render.render_gif_frames, start_arrays, end_arrays, params,
+                            params['num_frames'])
+    
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format='GIF', save_all=True, append_images=frames[1:],
+                   duration=params['interval'], loop=0, optimize=True, disposal=2)
+    return buffer.getvalue()
 
 # Main app logic
 def main():
@@ -222,8 +294,8 @@ def main():
     
     if start_file and end_file:
         try:
-            start_data = load_data(start_file)
-            end_data = load_data(end_file)
+            start_data = load_data(start_file, category_column, label_column)
+            end_data = load_data(end_file, category_column, label_column)
             
             st.session_state.current_start_data = start_data
             st.session_state.current_end_data = end_data
@@ -251,8 +323,9 @@ def main():
                 
                 # Show category breakdown
                 with st.expander("📊 Category Breakdown"):
+                    counts = start_data[category_column].value_counts()
                     for cat in categories:
-                        count = len(start_data[start_data[category_column] == cat])
+                        count = int(counts.get(cat, 0))
                         st.write(f"• **{cat}**: {count} data points")
             
         except Exception as e:
@@ -321,17 +394,19 @@ def main():
             category_mask = start_data[category_column].isin(selected_categories)
             filtered_start = start_data[category_mask]
             
-            # Point selection by category
+            # Point selection by category, split in one groupby pass
             selected_points = []
+            groups = dict(list(filtered_start.groupby(category_column, observed=True, sort=False)))
             
             for category in selected_categories:
-                cat_data = filtered_start[filtered_start[category_column] == category]
+                cat_data = groups.get(category, filtered_start.iloc[:0])
                 
                 with st.expander(f"📁 {category} ({len(cat_data)} points)", expanded=True):
-                    options = []
-                    for idx, row in cat_data.iterrows():
-                        label_text = str(row[label_column]) if pd.notna(row[label_column]) else f"Point {idx}"
-                        options.append((label_text, idx))
+                    # Build option labels column-wise rather than boxing each row
+                    labels = cat_data[label_column]
+                    fallback = pd.Series("Point " + cat_data.index.astype(str), index=cat_data.index)
+                    label_texts = labels.astype(str).where(labels.notna(), fallback)
+                    options = list(zip(label_texts, cat_data.index))
                     
                     selected_in_category = st.multiselect(
                         f"Select points from {category}:",
@@ -341,7 +416,8 @@ def main():
                     )
                     
                     # Get indices of selected points
-                    selected_indices = [opt[1] for opt in options if opt[0] in selected_in_category]
+                    selected_labels = set(selected_in_category)
+                    selected_indices = [opt[1] for opt in options if opt[0] in selected_labels]
                     selected_points.extend(selected_indices)
             
             # Step 5: Generate Animation
@@ -351,8 +427,9 @@ def main():
                 if st.button("🎬 Generate Animated Chart", type="primary"):
                     with st.spinner("Creating animation..."):
                         # Filter data to selected points
-                        final_start = start_data.iloc[selected_points].copy().reset_index(drop=True)
-                        final_end = end_data.iloc[selected_points].copy().reset_index(drop=True)
+                        point_idx = np.asarray(selected_points, dtype=np.intp)
+                        final_start = start_data.take(point_idx)
+                        final_end = end_data.take(point_idx)
                         
                         # Prepare parameters
                         params = {
@@ -362,58 +439,74 @@ def main():
                             'category_column': category_column,
                             'label_column': label_column,
                             'num_frames': num_frames,
+                            'preview_frames': min(PREVIEW_FRAMES, num_frames),
                             'interval': interval,
                             'scale': scale,
-                            'colors': st.session_state.colors,
+                            # Only the plotted categories, so unrelated color edits keep the cache
+                            'colors': {cat: st.session_state.colors[cat] for cat in selected_categories},
                             'title': custom_title
                         }
                         
-                        # Create and display animation
-                        fig, anim = create_animated_chart(final_start, final_end, params)
-                        
-                        # Convert to HTML
-                        html_str = anim.to_jshtml()
-                        
-                        st.markdown('<div class="status-box success-box">✅ Animation created successfully!</div>', unsafe_allow_html=True)
-                        
-                        # Display animation
-                        st.components.v1.html(html_str, height=600, scrolling=True)
+                        start_arrays, end_arrays = preprocess_data(
+                            final_start, final_end, x_column, y_column,
+                            size_column, category_column, label_column
+                        )
                         
-                        # Download options
-                        st.markdown("### 📥 Download Options")
+                        if browser_render:
+                            # The browser draws the frames itself, so all of them are shipped
+                            html_str = build_player_html(start_arrays, end_arrays, params)
+                        else:
+                            # Preview with a capped frame count; the GIF export renders every frame
+                            html_str = build_animation_html(start_arrays, end_arrays, params)
                         
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            # HTML download
-                            filename = f"{custom_title.lower().replace(' ', '_')}_animation.html"
-                            st.download_button(
-                                label="📄 Download HTML",
-                                data=html_str,
-                                file_name=filename,
-                                mime="text/html"
-                            )
-                        
-                        with col2:
-                            # GIF download
-                            if st.button("🎥 Create GIF"):
-                                with st.spinner("Creating GIF..."):
-                                    gif_filename = f"{custom_title.lower().replace(' ', '_')}_animation.gif"
-                                    writer = PillowWriter(fps=10)
-                                    anim.save(gif_filename, writer=writer)
-                                    
-                                    with open(gif_filename, "rb") as f:
-                                        gif_data = f.read()
-                                    
-                                    st.download_button(
-                                        label="📥 Download GIF",
-                                        data=gif_data,
-                                        file_name=gif_filename,
-                                        mime="image/gif"
-                                    )
-                                    
-                                    # Clean up
-                                    os.remove(gif_filename)
+                        st.session_state.animation = {
+                            'start_arrays': start_arrays,
+                            'end_arrays': end_arrays,
+                            'params': params,
+                            'html': html_str
+                        }
+                
+                # Keep showing the last animation so the GIF button survives reruns
+                if st.session_state.animation is not None:
+                    animation = st.session_state.animation
+                    anim_params = animation['params']
+                    html_str = animation['html']
+                    
+                    st.markdown('<div class="status-box success-box">✅ Animation created successfully!</div>', unsafe_allow_html=True)
+                    
+                    # Display animation
+                    st.components.v1.html(html_str, height=600, scrolling=True)
+                    
+                    # Download options
+                    st.markdown("### 📥 Download Options")
+                    
+                    col1, col2 = st.columns(2)
+                    
+                    with col1:
+                        # HTML download
+                        filename = f"{anim_params['title'].lower().replace(' ', '_')}_animation.html"
+                        st.download_button(
+                            label="📄 Download HTML",
+                            data=html_str,
+                            file_name=filename,
+                            mime="text/html"
+                        )
+                    
+                    with col2:
+                        # GIF download
+                        if st.button("🎥 Create GIF"):
+                            with st.spinner("Creating GIF..."):
+                                gif_filename = f"{anim_params['title'].lower().replace(' ', '_')}_animation.gif"
+                                gif_data = create_gif(
+                                    animation['start_arrays'], animation['end_arrays'], anim_params
+                                )
+                                
+                                st.download_button(
+                                    label="📥 Download GIF",
+                                    data=gif_data,
+                                    file_name=gif_filename,
+                                    mime="image/gif"
+                                )
 
 if __name__ == "__main__":
     main()
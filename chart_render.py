@@ -0,0 +1,172 @@
+import io
+import base64
+import numpy as np
+import pandas as pd
+import matplotlib as mpl
+mpl.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.colors import to_rgba
+
+# Chart drawing lives apart from the Streamlit script so worker processes can
+# import it without running the app
+
+# Charts never show spines, so make that the default for every new axes
+for side in ('top', 'right', 'bottom', 'left'):
+    mpl.rcParams[f'axes.spines.{side}'] = False
+
+PREVIEW_DPI = 72
+
+def precompute_frames(xy0, dxy, s0, ds, num_frames):
+    """Interpolate positions and sizes for every frame in one broadcast pass"""
+    progress = np.linspace(0.0, 1.0, num_frames, dtype=np.float32)
+    frame_offsets = np.empty((num_frames, *xy0.shape), dtype=np.float32)
+    frame_sizes = np.empty((num_frames, *s0.shape), dtype=np.float32)
+    
+    np.multiply(dxy, progress[:, None, None], out=frame_offsets)
+    frame_offsets += xy0
+    np.multiply(ds, progress[:, None], out=frame_sizes)
+    frame_sizes += s0
+    return progress, frame_offsets, frame_sizes
+
+def compute_chart_frames(start_arrays, end_arrays, scale, num_frames):
+    """Axis limits plus interpolated points and median lines for every frame"""
+    # Calculate medians
+    q1median_x = start_arrays['median_x']
+    q2median_x = end_arrays['median_x']
+    q1median_y = start_arrays['median_y']
+    q2median_y = end_arrays['median_y']
+    
+    # Set up axis limits from each dataset's extremes; fmin/fmax skip a side with no values
+    min_x = np.fmin(np.nanmin(start_arrays['x']), np.nanmin(end_arrays['x']))
+    max_x = np.fmax(np.nanmax(start_arrays['x']), np.nanmax(end_arrays['x']))
+    min_y = np.fmin(np.nanmin(start_arrays['y']), np.nanmin(end_arrays['y']))
+    max_y = np.fmax(np.nanmax(start_arrays['y']), np.nanmax(end_arrays['y']))
+    
+    x_range, y_range = max_x - min_x, max_y - min_y
+    x_padding = x_range * 0.15 if x_range > 0 else 1
+    y_padding = y_range * 0.15 if y_range > 0 else 1
+    
+    # Precompute interpolation arrays once so each frame is plain NumPy arithmetic
+    xy0 = np.column_stack([start_arrays['x'], start_arrays['y']])
+    dxy = np.column_stack([end_arrays['x'] - start_arrays['x'],
+                           end_arrays['y'] - start_arrays['y']])
+    # Scale straight into new arrays; the cached inputs are never touched
+    s0 = start_arrays['size'] * scale
+    ds = end_arrays['size'] - start_arrays['size']
+    ds *= scale
+    
+    # Interpolate every frame up front; frames only index into these
+    progress, offsets, sizes = precompute_frames(xy0, dxy, s0, ds, num_frames)
+    
+    return {
+        'xlim': (min_x - x_padding, max_x + x_padding),
+        'ylim': (min_y - y_padding, max_y + y_padding),
+        'offsets': offsets,
+        'sizes': sizes,
+        'median_x': q1median_x + (q2median_x - q1median_x) * progress,
+        'median_y': q1median_y + (q2median_y - q1median_y) * progress
+    }
+
+def setup_chart(start_arrays, end_arrays, params, num_frames, dpi=None):
+    """Build the chart figure and the callback that draws a given frame onto it"""
+    frames = compute_chart_frames(start_arrays, end_arrays, params['scale'], num_frames)
+    frame_offsets = frames['offsets']
+    frame_sizes = frames['sizes']
+    frame_median_x = frames['median_x']
+    frame_median_y = frames['median_y']
+    
+    # Categories never change between frames, so resolve their colors once and
+    # gather them per point by category code
+    categories = pd.Categorical(start_arrays['cat'])
+    palette = np.array([to_rgba(params['colors'][cat]) for cat in categories.categories])
+    color_array = palette[categories.codes]
+    
+    # Only points with a label get an annotation
+    label_idx = start_arrays['label_idx']
+    label_strs = start_arrays['label']
+    
+    # Create the figure and its artists once; frames only update them
+    # Figures are built outside pyplot, so nothing keeps them alive after each render
+    fig = Figure(figsize=(12, 8), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    
+    ax.set_xlim(frames['xlim'])
+    ax.set_ylim(frames['ylim'])
+    ax.set_xticklabels([])
+    ax.set_yticklabels([])
+    ax.tick_params(left=False, bottom=False)
+    ax.set_facecolor('#FAFAFA')
+    
+    scat = ax.scatter(frame_offsets[0, :, 0], frame_offsets[0, :, 1], s=frame_sizes[0],
+                     alpha=0.75, c=color_array,
+                     edgecolors='white', linewidth=0.8)
+    
+    vline = ax.axvline(frame_median_x[0], color='#666666', linestyle='-', linewidth=1.0, alpha=0.8)
+    hline = ax.axhline(frame_median_y[0], color='#666666', linestyle='-', linewidth=1.0, alpha=0.8)
+    
+    anns = [ax.annotate(title, (x_val, y_val), color='black',
+                        textcoords="offset points", xytext=(0, 12), 
+                        ha='center', fontsize=9, fontweight='normal')
+            for (x_val, y_val), title in zip(frame_offsets[0, label_idx], label_strs)]
+    
+    title = ax.set_title(f'{params["title"]} Landscape Over Time - Frame 1', 
+                        fontsize=14, fontweight='bold')
+    
+    def animate(frame):
+        scat.set_offsets(frame_offsets[frame])
+        scat.set_sizes(frame_sizes[frame])
+        
+        # Move median lines
+        vline.set_xdata([frame_median_x[frame]] * 2)
+        hline.set_ydata([frame_median_y[frame]] * 2)
+        
+        # Move labels
+        for ann, (x_val, y_val) in zip(anns, frame_offsets[frame, label_idx]):
+            ann.xy = (x_val, y_val)
+        
+        title.set_text(f'{params["title"]} Landscape Over Time - Frame {frame+1}')
+        
+        return (scat, vline, hline, title, *anns)
+    
+    fig.tight_layout()
+    return fig, animate
+
+def render_png_frames(start_arrays, end_arrays, params, frames):
+    """Render a run of preview frames to base64 PNGs on a figure of its own"""
+    fig, animate = setup_chart(start_arrays, end_arrays, params, params['preview_frames'], PREVIEW_DPI)
+    
+    images = []
+    for frame in frames:
+        animate(frame)
+        # Same encoding matplotlib's HTMLWriter embeds for each frame
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        images.append(base64.encodebytes(buffer.getvalue()).decode('ascii'))
+    
+    return images
+
+def render_gif_frames(start_arrays, end_arrays, params, frames):
+    """Render a run of frames to palette images on a figure of its own"""
+    from PIL import Image
+    
+    fig, animate = setup_chart(start_arrays, end_arrays, params, params['num_frames'])
+    size = fig.canvas.get_width_height(physical=True)
+    
+    # Agg keeps one renderer while the figure size is unchanged, so wrap its buffer
+    # once and reuse a single RGB image; only the palette frames are new per frame
+    fig.canvas.draw()
+    rgba = Image.frombuffer('RGBA', size, fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+    rgb = Image.new('RGB', size)
+    
+    images = []
+    for frame in frames:
+        animate(frame)
+        fig.canvas.draw()
+        
+        # Quantize straight from the Agg buffer with a per-frame adaptive palette
+        rgb.paste(rgba)
+        images.append(rgb.convert('P', palette=Image.ADAPTIVE, colors=256))
+    
+    return images
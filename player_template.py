@@ -0,0 +1,140 @@
+# Self-contained canvas player for the browser-side preview; /*DATA*/ is replaced
+# with the JSON payload built by build_player_html in bubble_chart_app.py
+
+PLAYER_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+    body { margin: 0; font-family: 'DejaVu Sans', Verdana, sans-serif; }
+    .controls { display: flex; align-items: center; gap: 0.75rem; padding: 0.25rem 0.5rem; }
+    .controls input[type=range] { flex: 1; }
+</style>
+</head>
+<body>
+<canvas id="chart"></canvas>
+<div class="controls">
+    <button id="play">❚❚</button>
+    <input id="scrub" type="range" min="0" value="0">
+</div>
+<script>
+const data = /*DATA*/;
+
+function decode(b64, ArrayType) {
+    const raw = atob(b64);
+    const bytes = new Uint8Array(raw.length);
+    for (let i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+    return new ArrayType(bytes.buffer);
+}
+
+// Positions are fractions of the axis range in 1/qmax steps, with qmax + 1 marking
+// a missing value; sizes are bubble diameters in 1/size_steps of a point
+const xy = decode(data.xy, Uint16Array);
+const diameters = decode(data.diameters, Uint16Array);
+const colorCodes = decode(data.color_codes, Uint16Array);
+const n = data.points;
+
+// Same 12x8 inch figure as the matplotlib preview at 72 DPI, where a point is one
+// pixel; fonts use px because a CSS pt is 4/3 px
+const width = 864, height = 576;
+// Axes box and title baseline as tight_layout places them on that figure
+const plot = { left: 10.8, top: 27.8, width: 842.4, height: 537.4 };
+
+const canvas = document.getElementById('chart');
+const ratio = window.devicePixelRatio || 1;
+canvas.width = width * ratio;
+canvas.height = height * ratio;
+canvas.style.width = width + 'px';
+canvas.style.height = height + 'px';
+const ctx = canvas.getContext('2d');
+ctx.scale(ratio, ratio);
+
+function px(x) { return plot.left + (x - data.xlim[0]) / (data.xlim[1] - data.xlim[0]) * plot.width; }
+function py(y) { return plot.top + (1 - (y - data.ylim[0]) / (data.ylim[1] - data.ylim[0])) * plot.height; }
+function qx(q) { return plot.left + q / data.qmax * plot.width; }
+function qy(q) { return plot.top + (1 - q / data.qmax) * plot.height; }
+
+function draw(frame) {
+    ctx.fillStyle = '#FFFFFF';
+    ctx.fillRect(0, 0, width, height);
+    ctx.fillStyle = '#FAFAFA';
+    ctx.fillRect(plot.left, plot.top, plot.width, plot.height);
+
+    // Bubbles and median lines are clipped to the plot area
+    ctx.save();
+    ctx.beginPath();
+    ctx.rect(plot.left, plot.top, plot.width, plot.height);
+    ctx.clip();
+
+    ctx.globalAlpha = 0.75;
+    ctx.lineWidth = 0.8;
+    ctx.strokeStyle = '#FFFFFF';
+    const base = frame * n;
+    for (let i = 0; i < n; i++) {
+        const d = diameters[base + i] / data.size_steps;
+        const x = xy[2 * (base + i)], y = xy[2 * (base + i) + 1];
+        if (!(d > 0) || x > data.qmax || y > data.qmax) continue;
+        ctx.beginPath();
+        ctx.arc(qx(x), qy(y), d / 2, 0, 2 * Math.PI);
+        ctx.fillStyle = data.palette[colorCodes[i]];
+        ctx.fill();
+        ctx.stroke();
+    }
+
+    ctx.globalAlpha = 0.8;
+    ctx.lineWidth = 1;
+    ctx.strokeStyle = '#666666';
+    ctx.beginPath();
+    ctx.moveTo(px(data.median_x[frame]), plot.top);
+    ctx.lineTo(px(data.median_x[frame]), plot.top + plot.height);
+    ctx.moveTo(plot.left, py(data.median_y[frame]));
+    ctx.lineTo(plot.left + plot.width, py(data.median_y[frame]));
+    ctx.stroke();
+    ctx.restore();
+
+    ctx.fillStyle = '#000000';
+    ctx.textAlign = 'center';
+    ctx.font = '9px "DejaVu Sans", Verdana, sans-serif';
+    for (let k = 0; k < data.label_idx.length; k++) {
+        const i = base + data.label_idx[k];
+        if (xy[2 * i] > data.qmax || xy[2 * i + 1] > data.qmax) continue;
+        ctx.fillText(data.labels[k], qx(xy[2 * i]), qy(xy[2 * i + 1]) - 12);
+    }
+
+    ctx.font = 'bold 14px "DejaVu Sans", Verdana, sans-serif';
+    ctx.fillText(data.title + ' Landscape Over Time - Frame ' + (frame + 1), width / 2, 22);
+}
+
+const scrub = document.getElementById('scrub');
+const play = document.getElementById('play');
+scrub.max = data.frames - 1;
+
+let frame = 0;
+let timer = null;
+
+function show(f) {
+    frame = f;
+    scrub.value = f;
+    draw(f);
+}
+
+function start() {
+    play.textContent = '❚❚';
+    timer = setInterval(function () { show((frame + 1) % data.frames); }, data.interval);
+}
+
+function stop() {
+    play.textContent = '▶';
+    clearInterval(timer);
+    timer = null;
+}
+
+play.onclick = function () { timer === null ? start() : stop(); };
+scrub.oninput = function () { stop(); show(Number(scrub.value)); };
+
+show(0);
+start();
+</script>
+</body>
+</html>
+"""